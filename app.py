@@ -1,9 +1,16 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import pulp as pl
 import plotly.express as px
 import plotly.graph_objects as go
 import os
+import io
+
+try:
+    import highspy
+except ImportError:  # Optional: without it the ILP is solved with CBC through PuLP
+    highspy = None
 
 # Page configuration
 st.set_page_config(
@@ -13,31 +20,23 @@ st.set_page_config(
 )
 
 # Custom CSS
-st.markdown("""
-<style>
-    .main-header {
-        font-size: 3rem;
-        font-weight: bold;
-        color: #1E40AF;
-        text-align: center;
-        margin-bottom: 0.5rem;
-    }
-    .sub-header {
-        font-size: 1.2rem;
-        color: #6B7280;
-        text-align: center;
-        margin-bottom: 2rem;
-    }
-    .stButton>button {
-        width: 100%;
-        background-color: #2563EB;
-        color: white;
-        font-weight: bold;
-        padding: 0.75rem;
-        border-radius: 8px;
-    }
-</style>
-""", unsafe_allow_html=True)
+@st.cache_resource
+def load_css():
+    """Read the app stylesheet once per server process"""
+    with open('styles.css') as f:
+        return f.read()
+
+st.markdown(f"<style>{load_css()}</style>", unsafe_allow_html=True)
+
+# HTML of one meal card in the weekly schedule, filled from a plan entry
+MEAL_CARD = """<div class="meal-card {card_class}">
+<h4>{card_title}</h4>
+<h3>{dish}</h3>
+<p>📍 {restaurant}</p>
+<hr>
+<p>💵 ${price:.2f} | 🔥 {calories:.0f} kcal | 💪 {protein:.1f}g</p>
+</div>"""
+MEAL_CARD_TITLES = {'Lunch': '🌅 LUNCH', 'Dinner': '🌙 DINNER'}
 
 # Required columns
 REQUIRED_COLUMNS = ['Restaurant', 'Meal', 'price', 'calories_kcal', 'protein_g', 'fat_g', 
@@ -49,6 +48,41 @@ REQUIRED_COLUMNS = ['Restaurant', 'Meal', 'price', 'calories_kcal', 'protein_g',
                    'loose_weight_diet', 'gaining_muscle_diet', 'spicy', 'fried', 'grilled ', 
                    'baked', 'boiled']
 
+# Column types used when parsing a meal CSV: measurements as float32 (blanks
+# become NaN); the 0/1 columns are converted to int8 by read_meal_csv()
+NUMERIC_COLUMNS = ['price', 'calories_kcal', 'protein_g', 'fat_g', 'sugar_g', 'carbs_g',
+                   'calcium_mg', 'fiber_mg', 'cholesterol_mg', 'potassium_mg', 'iron_mg',
+                   'sodium_mg']
+BINARY_COLUMNS = [col for col in REQUIRED_COLUMNS
+                  if col not in NUMERIC_COLUMNS and col not in ('Restaurant', 'Meal')]
+DTYPES = {col: 'float32' for col in NUMERIC_COLUMNS}
+# Names repeat across rows, so keep them as integer-coded categoricals
+DTYPES.update({'Restaurant': 'category', 'Meal': 'category'})
+
+# Preference filters: (preference key, column, value a meal must have)
+FILTERS = [
+    ('diabetic', 'diabetic_friendly', 1),
+    ('celiac', 'contains_gluten', 0),
+    ('lactose_intolerant', 'contains_lactose', 0),
+    ('nut_allergy', 'contains_nuts', 0),
+    ('vegan', 'vegan ', 1),  # Note: space in column name
+    ('vegetarian', 'vegetarian', 1),
+    ('pescatarian', 'pescatarian', 1),
+    ('keto', 'keto_friendly', 1),
+    ('kosher', 'kosher', 1),
+    ('halal', 'halal', 1),
+    ('gain_weight', 'gaining_weight_diet', 1),
+    ('lose_weight', 'loose_weight_diet', 1),
+    ('gain_muscle', 'gaining_muscle_diet', 1),
+    ('avoid_grains', 'contains_grains', 0),
+    ('avoid_legumes', 'contains_legumes', 0),
+    ('avoid_bread', 'contains_bread', 0),
+    ('avoid_dairy', 'contains_dairy', 0),
+    ('avoid_spicy', 'spicy', 0),
+    ('avoid_fried', 'fried', 0),
+]
+FLAG_COLS = list(dict.fromkeys(col for _, col, _ in FILTERS))
+
 # Initialize session state
 if 'step' not in st.session_state:
     st.session_state.step = 1
@@ -58,19 +92,487 @@ if 'results' not in st.session_state:
     st.session_state.results = None
 if 'using_default' not in st.session_state:
     st.session_state.using_default = False
+if 'flag_arrays' not in st.session_state:
+    st.session_state.flag_arrays = None
+
+# Function to parse a meal CSV
+def read_meal_csv(source):
+    """Read only the required columns of a meal CSV, with compact column types"""
+    # A callable usecols tolerates missing columns so the caller can report them
+    df = pd.read_csv(source, usecols=lambda col: col in REQUIRED_COLUMNS, dtype=DTYPES)
+    
+    # 0/1 columns as int8. A blank or any value other than 0/1 becomes -1, which,
+    # like a blank cell, matches no filter and does not count as legumes/grains
+    for col in BINARY_COLUMNS:
+        if col in df.columns:
+            values = pd.to_numeric(df[col], errors='coerce')
+            df[col] = values.where(values.isin([0, 1]), -1).astype(np.int8)
+    return df
 
 # Function to load default CSV
 def load_default_csv():
-    """Try to load the default CSV file"""
+    """Try to load the default database (parsed once per file version, then served from the cache)
+    
+    lunchplandef3.parquet is the same table as lunchplandef3.csv, already with
+    the column types of read_meal_csv(), so it loads without any text parsing.
+    Rebuild it after editing the CSV with
+    read_meal_csv('lunchplandef3.csv').to_parquet('lunchplandef3.parquet').
+    
+    Only successful loads are cached: a missing file or a parse error is
+    checked again on the next attempt.
+    """
     try:
-        if os.path.exists('lunchplandef3.csv'):
-            return pd.read_csv('lunchplandef3.csv')
-        else:
-            return None
+        for path in ('lunchplandef3.parquet', 'lunchplandef3.csv'):
+            if os.path.exists(path):
+                try:
+                    return read_default_database(path, os.path.getmtime(path))
+                except ImportError:
+                    # No parquet engine installed: fall back to the CSV
+                    continue
+        return None
     except Exception as e:
         st.error(f"Error loading default database: {str(e)}")
         return None
 
+@st.cache_data(show_spinner=False)
+def read_default_database(path, mtime):
+    """Parse one default database file; mtime is only a cache key, so an edited file is read again"""
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path, columns=REQUIRED_COLUMNS)
+    return read_meal_csv(path)
+
+# Function to extract the filter columns once per loaded database
+def build_flag_arrays(df):
+    """Return the preference filter columns as one int8 matrix, a contiguous row per FLAG_COLS entry"""
+    return np.ascontiguousarray(df[FLAG_COLS].to_numpy(dtype=np.int8).T)
+
+# Function to serialize a plan for the CSV download, cached per plan like the charts
+@st.cache_data(show_spinner=False)
+def build_plan_csv(plan_json):
+    """Return the plan as CSV bytes, with two decimals instead of full float precision"""
+    plan_df = pd.read_json(io.StringIO(plan_json), orient='records')
+    return plan_df.to_csv(index=False, float_format='%.2f').encode()
+
+# Function to build the result charts, cached per plan so reruns reuse the figures
+@st.cache_data(show_spinner=False)
+def build_charts(plan_json, days):
+    """Build the daily calories, daily protein and restaurant charts of a plan"""
+    plan_df = pd.read_json(io.StringIO(plan_json), orient='records')
+    
+    # Daily totals for both bar charts, in weekday order
+    daily_stats = plan_df.groupby('day', sort=False)[['calories', 'protein']].sum()
+    daily_stats = daily_stats.reindex(list(days)).reset_index()
+    
+    # Daily calories chart
+    fig_cal = px.bar(daily_stats, x='day', y='calories', 
+                    title='Daily Calories Distribution',
+                    labels={'calories': 'Calories (kcal)', 'day': 'Day'},
+                    color='calories',
+                    color_continuous_scale='Blues')
+    fig_cal.update_layout(showlegend=False)
+    
+    # Daily protein chart
+    fig_prot = px.bar(daily_stats, x='day', y='protein',
+                     title='Daily Protein Distribution',
+                     labels={'protein': 'Protein (g)', 'day': 'Day'},
+                     color='protein',
+                     color_continuous_scale='Greens')
+    fig_prot.update_layout(showlegend=False)
+    
+    # Restaurant distribution
+    restaurant_counts = plan_df['restaurant'].value_counts().reset_index()
+    restaurant_counts.columns = ['Restaurant', 'Meals']
+    
+    fig_rest = px.pie(restaurant_counts, values='Meals', names='Restaurant',
+                      title='Meals per Restaurant',
+                      color_discrete_sequence=px.colors.qualitative.Set3)
+    
+    return fig_cal, fig_prot, fig_rest
+
+# ==================== OPTIMIZATION FUNCTION ====================
+DAY_NAMES = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+MEAL_TYPES = ["Lunch", "Dinner"]
+# The 14 (day, meal type) slots of the week, ordered Monday lunch .. Sunday dinner
+SLOTS = [(d, m) for d in range(len(DAY_NAMES)) for m in MEAL_TYPES]
+MEALS_PER_WEEK = len(SLOTS)
+# "HiGHS" builds the constraint matrix as arrays and hands it to highspy in one
+# call; "CBC" (or HiGHS without highspy installed) goes through PuLP and CBC.
+ILP_SOLVER = "HiGHS"
+# Seconds either solver may spend before giving up (with an error rather than an
+# unproven plan), so a hard model cannot hang the page
+SOLVER_TIME_LIMIT = 15
+# Error raised whenever no valid plan within the budget can be returned
+NO_PLAN_MESSAGE = "Could not find optimal solution. Try increasing budget or relaxing some constraints."
+
+
+@st.cache_data(show_spinner=False)
+def run_optimization(df, preferences, _flag_arrays=None, _warm_start=None):
+    """Run the meal plan optimization: greedy when provably optimal, otherwise PuLP linear programming"""
+    
+    active_filters = tuple(pref_key for pref_key, _, _ in FILTERS if preferences[pref_key])
+    filtered = filter_meals(df, active_filters, _flag_arrays)
+    
+    if len(filtered) < 14:
+        raise Exception(f"Not enough meals after filtering. Only {len(filtered)} meals available. Need at least 14 meals to create a weekly plan.")
+    
+    # Nutritional targets based on gender
+    if preferences['gender'] == "male":
+        cal_min, cal_max = 1100, 1600
+        protein_min = 50
+    elif preferences['gender'] == "female":
+        cal_min, cal_max = 900, 1400
+        protein_min = 45
+    else:
+        cal_min, cal_max = 1000, 1500
+        protein_min = 45
+    
+    previous_plan = _warm_start['plan'] if _warm_start else None
+    assignment = solve_meal_plan(filtered, previous_plan)
+    
+    # C1: Budget constraint. The solve minimizes cost without it, so the plan
+    # either fits the budget or no plan does.
+    if price_cents(filtered['price'].to_numpy()[list(assignment.values())]).sum() > preferences['budget'] * 100:
+        raise Exception(NO_PLAN_MESSAGE)
+    
+    # Extract solution (one row lookup for the whole week, then plain column arrays)
+    chosen = filtered.loc[[assignment[s] for s in range(len(SLOTS))]]
+    plan = []
+    for (d, m), restaurant, dish, price, calories, protein in zip(
+            SLOTS, *(chosen[col].to_numpy() for col in ('Restaurant', 'Meal', 'price', 'calories_kcal', 'protein_g'))):
+        plan.append({
+            'day': DAY_NAMES[d],
+            'meal_type': m,
+            'restaurant': restaurant,
+            'dish': dish,
+            'price': price,
+            'calories': calories,
+            'protein': protein
+        })
+    
+    # Calculate metrics (plan is in SLOTS order, so each row of the 7x2 reshape is one day)
+    actual_cost = sum(p['price'] for p in plan)
+    calories = chosen['calories_kcal'].to_numpy().reshape(len(DAY_NAMES), len(MEAL_TYPES))
+    protein = chosen['protein_g'].to_numpy().reshape(len(DAY_NAMES), len(MEAL_TYPES))
+    avg_calories = calories.sum(axis=1).mean()
+    avg_protein = protein.sum(axis=1).mean()
+    
+    return {
+        'plan': plan,
+        'total_cost': actual_cost,
+        'budget_used': (actual_cost / preferences['budget']) * 100,
+        'avg_calories': avg_calories,
+        'avg_protein': avg_protein
+    }
+
+
+@st.cache_data(show_spinner=False)
+def filter_meals(df, active_filters, _flag_arrays=None):
+    """Return the priced meals that pass every active preference filter, re-indexed from 0.
+    
+    Cached on the meal database and the active filter keys; the flag arrays
+    are derived from df, so they are left out of the cache key.
+    """
+    flag_arrays = _flag_arrays if _flag_arrays is not None else build_flag_arrays(df)
+    filters = {pref_key: (FLAG_COLS.index(col), value) for pref_key, col, value in FILTERS}
+    
+    # Apply filters based on preferences as one boolean mask, updated in place,
+    # starting from the meals with a usable price (a blank price cannot be costed)
+    mask = np.isfinite(df['price'].to_numpy(dtype=float))
+    for pref_key in active_filters:
+        row, value = filters[pref_key]
+        np.logical_and(mask, flag_arrays[row] == value, out=mask)
+    return df.iloc[mask].reset_index(drop=True)
+
+
+@st.cache_data(show_spinner=False)
+def solve_meal_plan(filtered, _previous_plan=None):
+    """Return the cheapest {slot: meal index} assignment of the filtered meals.
+    
+    Cached on the filtered meals. The budget is not an input: the
+    cheapest plan is the answer for every budget it fits, so moving the budget
+    slider reuses the cached solve and run_optimization() only checks the
+    cost. The previous plan only warm-starts the ILP and does not change the
+    optimal cost, so it is not part of the cache key either.
+    """
+    prices = filtered["price"].to_numpy()
+    rest_ids = pd.factorize(filtered["Restaurant"])[0]
+    dinner_ok = dinner_safe(filtered)
+    
+    # Cheapest week first: when it is valid it is optimal and no solver is needed
+    picked = greedy_pick(prices, rest_ids, dinner_ok)
+    if picked is None:
+        if ILP_SOLVER == "HiGHS" and highspy is not None:
+            picked = solve_selection_highs(filtered, _previous_plan)
+        else:
+            picked = solve_selection_ilp(filtered, _previous_plan)
+    return seat_picks(picked, rest_ids, dinner_ok)
+
+
+def greedy_pick(prices, rest_ids, dinner_ok):
+    """Pick the cheapest valid 14 meals by sorting, without running the ILP.
+    
+    Two sort-based picks are each a lower bound on the cost of any valid plan:
+    the 14 cheapest dishes with at most 5 per restaurant (ignoring the dinner
+    rules), and the 14 cheapest dishes with at least 7 dinner-safe ones
+    (ignoring the restaurant cap). A pick that also satisfies the rule it
+    ignored is valid, hence optimal. Returns the picked positions, or None
+    when neither pick is valid and the ILP has to decide.
+    """
+    by_price = np.argsort(prices, kind="stable")
+    
+    # Pick 1: cheapest dishes under the restaurant cap (price rank within the restaurant < 5)
+    rank_in_restaurant = pd.Series(rest_ids[by_price]).groupby(rest_ids[by_price]).cumcount().to_numpy()
+    cap_pick = by_price[rank_in_restaurant < 5][:MEALS_PER_WEEK]
+    
+    # Pick 2: cheapest dishes, with the priciest grain/legume ones swapped for the cheapest dinner-safe rest
+    dinner_pick = by_price[:MEALS_PER_WEEK]
+    missing = len(DAY_NAMES) - dinner_ok[dinner_pick].sum()
+    if missing > 0:
+        rest = by_price[MEALS_PER_WEEK:]
+        dinner_pick = np.concatenate([
+            dinner_pick[dinner_ok[dinner_pick]],
+            dinner_pick[~dinner_ok[dinner_pick]][:-missing],
+            rest[dinner_ok[rest]][:missing]
+        ])
+    
+    for picked in (cap_pick, dinner_pick):
+        if (len(picked) == MEALS_PER_WEEK
+                and dinner_ok[picked].sum() >= len(DAY_NAMES)
+                and np.bincount(rest_ids[picked]).max() <= 5):
+            return picked
+    return None
+
+
+def seat_picks(picked, rest_ids, dinner_ok):
+    """Spread 14 picked dishes over the week, dinners from the dinner-safe ones; returns {slot: meal index}"""
+    dinners = picked[dinner_ok[picked]][:len(DAY_NAMES)]
+    lunches = np.setdiff1d(picked, dinners)
+    pairs = pair_lunches_with_dinners(rest_ids[lunches].tolist(), rest_ids[dinners].tolist())
+    if pairs is None:
+        raise Exception(NO_PLAN_MESSAGE)
+    
+    assignment = {}
+    for d, (l, k) in enumerate(pairs):
+        assignment[SLOTS.index((d, "Lunch"))] = int(lunches[l])
+        assignment[SLOTS.index((d, "Dinner"))] = int(dinners[k])
+    return assignment
+
+
+def pair_lunches_with_dinners(lunch_restaurants, dinner_restaurants):
+    """Match lunches to dinners so no day has both meals from the same restaurant.
+    
+    Bipartite matching by augmenting paths; a perfect matching always exists
+    while no restaurant serves more than 5 of the 14 meals. Returns a list of
+    (lunch position, dinner position) pairs, one per day, or None.
+    """
+    n = len(dinner_restaurants)
+    lunch_of = [None] * n
+    
+    def augment(l, seen):
+        for k in range(n):
+            if k not in seen and lunch_restaurants[l] != dinner_restaurants[k]:
+                seen.add(k)
+                if lunch_of[k] is None or augment(lunch_of[k], seen):
+                    lunch_of[k] = l
+                    return True
+        return False
+    
+    for l in range(len(lunch_restaurants)):
+        if not augment(l, set()):
+            return None
+    return sorted((l, k) for k, l in enumerate(lunch_of))
+
+
+def solve_selection_ilp(filtered, previous_plan=None):
+    """Pick the cheapest valid 14 meals exactly with PuLP and CBC; returns their index.
+    
+    The week is symmetric once the meals are chosen: which picks are lunches
+    and which are dinners does not change the cost, and any 14 meals with at
+    most 5 per restaurant and 7 dinner-safe ones can be seated with no
+    restaurant twice on a day (see pair_lunches_with_dinners). So the model
+    only selects meals, one variable per meal instead of one per (meal, slot).
+    
+    previous_plan is an earlier result's plan; the meals of it that are still
+    available are handed to the solver as a MIP start.
+    """
+    
+    kept, filtered = candidate_meals(filtered)
+    
+    meal_indices = list(filtered.index)
+    
+    # Plain arrays for the per-meal lookups inside the model-building loops
+    prices = price_cents(filtered["price"].to_numpy())
+    # Restaurant -> row positions of its meals, built in one grouping pass
+    # (observed=True so restaurants with no meals left after filtering get no row)
+    rest_to_indices = filtered.groupby("Restaurant", sort=False, observed=True).indices
+    dinner_ok = dinner_safe(filtered)
+    
+    # Create optimization problem
+    prob = pl.LpProblem("WeeklyMealPlan", pl.LpMinimize)
+    
+    # Decision variables: z[i] = 1 if meal i is on this week's menu
+    # (a plain list by row position, so every row below is built from integer index arrays)
+    z = pl.LpVariable.matrix("z", meal_indices, cat="Binary")
+    
+    # Objective function: minimize total cost in cents (built in one shot from (variable, price) pairs)
+    prob += pl.LpAffineExpression(list(zip(z, prices.tolist())))
+    
+    # ==================== CONSTRAINTS ====================
+    # (C1, the budget, is checked on the result by run_optimization)
+    
+    # C2: 14 meals, one per slot (C3, no repeats, holds since z is binary)
+    prob += pl.LpAffineExpression([(v, 1) for v in z]) == MEALS_PER_WEEK, "MealsPerWeek"
+    
+    # C4: Max 5 meals from same restaurant per week
+    # (C5, max 1 meal per restaurant per day, is then guaranteed by the seating)
+    for r, idxs in rest_to_indices.items():
+        prob += pl.LpAffineExpression([(z[i], 1) for i in idxs.tolist()]) <= 5, f"MaxRestaurantWeek_{r}"
+    
+    # C6/C7: Enough meals without legumes or grains to fill the 7 dinners
+    prob += pl.LpAffineExpression([
+        (z[i], 1) for i in np.flatnonzero(dinner_ok).tolist()
+    ]) >= len(DAY_NAMES), "DinnerSafeMeals"
+    
+    # Warm start: put the previous plan's meals back on the menu
+    if previous_plan:
+        for i in plan_positions(filtered, previous_plan):
+            z[i].setInitialValue(1)
+    
+    # Solve the optimization problem
+    # Let CBC run its branch-and-bound tree search on every core; with integer
+    # costs its presolve and cut generators can also use objective integrality
+    solver = pl.PULP_CBC_CMD(msg=0, warmStart=bool(previous_plan),
+                             threads=os.cpu_count() or 4, presolve=True, cuts=True, strong=5,
+                             timeLimit=SOLVER_TIME_LIMIT, options=['preprocess on', 'heuristics on'])
+    # CBC runs as a subprocess and reads the model from a file: keep that file in memory when possible
+    if os.access('/dev/shm', os.W_OK):
+        solver.tmpDir = '/dev/shm'
+    status = prob.solve(solver)
+    
+    # PuLP also reports "Optimal" when the time limit stops CBC with a plan in hand;
+    # only a proven optimum may be cached and checked against the budget
+    if pl.LpStatus[status] != "Optimal" or prob.sol_status != pl.LpSolutionOptimal:
+        raise Exception(NO_PLAN_MESSAGE)
+    
+    # Read every variable once into an array and select in NumPy
+    values = np.fromiter((v.varValue or 0.0 for v in z), dtype=float, count=len(z))
+    return kept[np.flatnonzero(values > 0.5)].to_numpy()
+
+
+def solve_selection_highs(filtered, previous_plan=None):
+    """Solve the same meal-selection ILP as solve_selection_ilp() with highspy.
+    
+    The constraint matrix is assembled with NumPy in column-wise (CSC) form and
+    passed to HiGHS in a single passModel() call, so no PuLP expression is
+    built per variable or row. Column i is z[i].
+    """
+    
+    kept, filtered = candidate_meals(filtered)
+    
+    n_meals = len(filtered)
+    prices = price_cents(filtered["price"].to_numpy()).astype(float)
+    rest_ids, restaurants = pd.factorize(filtered["Restaurant"])
+    dinner_ok = dinner_safe(filtered)
+    
+    # Row layout: C2 meals per week | C6/C7 dinner-safe meals | C4 restaurant per week
+    # (C1, the budget, is checked on the result by run_optimization)
+    meals_row, dinner_row, week_row = 0, 1, 2
+    n_rows = week_row + len(restaurants)
+    
+    # Every column has an entry in C2 and C4; dinner-safe meals also in C6/C7
+    meal = np.arange(n_meals)
+    safe = np.flatnonzero(dinner_ok)
+    cols = np.concatenate([meal, meal, safe])
+    rows = np.concatenate([
+        np.full(n_meals, meals_row),
+        week_row + rest_ids,
+        np.full(len(safe), dinner_row)
+    ])
+    values = np.ones(len(cols))
+    order = np.lexsort((rows, cols))
+    
+    row_lower = np.full(n_rows, -highspy.kHighsInf)
+    row_upper = np.full(n_rows, 5.0)
+    row_lower[meals_row] = row_upper[meals_row] = MEALS_PER_WEEK
+    row_lower[dinner_row], row_upper[dinner_row] = len(DAY_NAMES), highspy.kHighsInf
+    
+    lp = highspy.HighsLp()
+    lp.num_col_ = n_meals
+    lp.num_row_ = n_rows
+    lp.col_cost_ = prices
+    lp.col_lower_ = np.zeros(n_meals)
+    lp.col_upper_ = np.ones(n_meals)
+    lp.row_lower_ = row_lower
+    lp.row_upper_ = row_upper
+    lp.integrality_ = [highspy.HighsVarType.kInteger] * n_meals
+    lp.a_matrix_.format_ = highspy.MatrixFormat.kColwise
+    lp.a_matrix_.start_ = np.searchsorted(cols[order], np.arange(n_meals + 1))
+    lp.a_matrix_.index_ = rows[order]
+    lp.a_matrix_.value_ = values[order]
+    
+    h = highspy.Highs()
+    h.setOptionValue("output_flag", False)
+    h.setOptionValue("time_limit", float(SOLVER_TIME_LIMIT))
+    h.passModel(lp)
+    
+    # Warm start: put the previous plan's meals back on the menu
+    if previous_plan:
+        start = np.zeros(n_meals)
+        start[plan_positions(filtered, previous_plan)] = 1
+        solution = highspy.HighsSolution()
+        solution.col_value = start
+        h.setSolution(solution)
+    
+    h.run()
+    # A plan cut short by the time limit is not proven optimal, so it is not returned
+    if h.getModelStatus() != highspy.HighsModelStatus.kOptimal:
+        raise Exception(NO_PLAN_MESSAGE)
+    
+    return kept[np.flatnonzero(np.asarray(h.getSolution().col_value) > 0.5)].to_numpy()
+
+
+def dinner_safe(meals):
+    """Return a boolean array of the meals allowed at dinner: not flagged with legumes or grains"""
+    return ((meals["contains_legumes"] != 1) & (meals["contains_grains"] != 1)).to_numpy()
+
+
+def candidate_meals(filtered):
+    """Return the labels of the meals worth modelling and those meals re-indexed from 0"""
+    # Only model the meals that can appear in an optimal plan
+    kept = undominated_meals(filtered)
+    return kept, filtered.loc[kept].reset_index(drop=True)
+
+
+def plan_positions(meals, previous_plan):
+    """Return the row positions in meals of the previous plan's dishes that are still available"""
+    position = {(r, m): i for i, (r, m) in enumerate(zip(meals["Restaurant"], meals["Meal"]))}
+    found = (position.get((p['restaurant'], p['dish'])) for p in previous_plan)
+    return [i for i in found if i is not None]
+
+
+def price_cents(prices):
+    """Return dollar prices as whole cents, so costs add up exactly and the ILP objective is integral"""
+    prices = np.asarray(prices, dtype=float)
+    if not np.isfinite(prices).all():
+        raise ValueError("Meal prices must be finite numbers")
+    return np.round(prices * 100).astype(np.int64)
+
+
+def undominated_meals(filtered):
+    """Return the index of the meals that are worth modelling, in index order.
+    
+    A restaurant serves at most 5 meals a week, so a dish with 5 cheaper
+    dishes from the same restaurant can always be swapped for an unused one
+    in its slot. Dinner slots also need the replacement to be dinner-safe,
+    so each restaurant keeps its 5 cheapest dishes plus its 5 cheapest
+    dinner-safe dishes; the optimal cost is unchanged.
+    """
+    by_price = filtered.sort_values("price", kind="stable")
+    dinner_ok = dinner_safe(by_price)
+    cheapest = by_price.groupby("Restaurant", observed=True).head(5).index
+    cheapest_dinners = by_price[dinner_ok].groupby("Restaurant", observed=True).head(5).index
+    return cheapest.union(cheapest_dinners).sort_values()
+
 # Header
 st.markdown('<div class="main-header">🍽️ Smart Dining on Campus</div>', unsafe_allow_html=True)
 st.markdown('<div class="sub-header">Your personalized weekly meal optimization system</div>', unsafe_allow_html=True)
@@ -113,7 +615,7 @@ if st.session_state.step == 1:
         
         if uploaded_file is not None:
             try:
-                df = pd.read_csv(uploaded_file)
+                df = read_meal_csv(uploaded_file)
                 
                 # Validate columns
                 missing_cols = [col for col in REQUIRED_COLUMNS if col not in df.columns]
@@ -127,6 +629,7 @@ if st.session_state.step == 1:
                     st.warning("Please ensure your CSV has all required columns or use the default database.")
                 else:
                     st.session_state.csv_data = df
+                    st.session_state.flag_arrays = build_flag_arrays(df)
                     st.session_state.using_default = False
                     st.success(f"✅ File loaded successfully! {len(df)} meals available.")
                     
@@ -149,6 +652,7 @@ if st.session_state.step == 1:
             
             if default_df is not None:
                 st.session_state.csv_data = default_df
+                st.session_state.flag_arrays = build_flag_arrays(default_df)
                 st.session_state.using_default = True
                 st.success(f"✅ Default database loaded! {len(default_df)} meals available.")
                 
@@ -177,85 +681,87 @@ elif st.session_state.step == 2:
     else:
         st.info(f"📊 Using uploaded database with {len(st.session_state.csv_data)} meals")
     
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        st.subheader("🏥 Health & Allergies")
-        diabetic = st.checkbox("Diabetic", help="Filter meals suitable for diabetics")
-        celiac = st.checkbox("Celiac (Gluten Intolerant)", help="Exclude meals containing gluten")
-        lactose_intolerant = st.checkbox("Lactose Intolerant", help="Exclude meals with lactose")
-        nut_allergy = st.checkbox("Nut Allergy", help="Exclude meals containing nuts")
+    # The preferences live in a form, so ticking boxes does not rerun the app
+    # until the plan is requested
+    with st.form("preferences_form", border=False):
+        col1, col2 = st.columns(2)
         
-        st.subheader("🥗 Diet Type")
-        vegan = st.checkbox("Vegan", help="Only plant-based meals")
-        vegetarian = st.checkbox("Vegetarian", help="No meat, but dairy/eggs OK")
-        pescatarian = st.checkbox("Pescatarian", help="Fish OK, no other meat")
-        keto = st.checkbox("Keto", help="Low-carb, high-fat diet")
+        with col1:
+            st.subheader("🏥 Health & Allergies")
+            diabetic = st.checkbox("Diabetic", help="Filter meals suitable for diabetics")
+            celiac = st.checkbox("Celiac (Gluten Intolerant)", help="Exclude meals containing gluten")
+            lactose_intolerant = st.checkbox("Lactose Intolerant", help="Exclude meals with lactose")
+            nut_allergy = st.checkbox("Nut Allergy", help="Exclude meals containing nuts")
         
-        st.subheader("🕌 Religious/Cultural")
-        kosher = st.checkbox("Kosher", help="Meals prepared according to Jewish law")
-        halal = st.checkbox("Halal", help="Meals prepared according to Islamic law")
-    
-    with col2:
-        st.subheader("🎯 Health Goals")
-        gain_weight = st.checkbox("Gain Weight", help="Higher calorie meals")
-        lose_weight = st.checkbox("Lose Weight", help="Lower calorie meals")
-        gain_muscle = st.checkbox("Gain Muscle", help="High protein meals")
+            st.subheader("🥗 Diet Type")
+            vegan = st.checkbox("Vegan", help="Only plant-based meals")
+            vegetarian = st.checkbox("Vegetarian", help="No meat, but dairy/eggs OK")
+            pescatarian = st.checkbox("Pescatarian", help="Fish OK, no other meat")
+            keto = st.checkbox("Keto", help="Low-carb, high-fat diet")
         
-        st.subheader("🍽️ Food Preferences")
-        avoid_grains = st.checkbox("Avoid Grains", help="No rice, wheat, oats, etc.")
-        avoid_legumes = st.checkbox("Avoid Legumes", help="No beans, lentils, peas")
-        avoid_bread = st.checkbox("Avoid Bread", help="No bread products")
-        avoid_dairy = st.checkbox("Avoid Dairy", help="No milk, cheese, yogurt")
-        avoid_spicy = st.checkbox("Avoid Spicy Food", help="No hot/spicy dishes")
-        avoid_fried = st.checkbox("Avoid Fried Food", help="No fried preparations")
+            st.subheader("🕌 Religious/Cultural")
+            kosher = st.checkbox("Kosher", help="Meals prepared according to Jewish law")
+            halal = st.checkbox("Halal", help="Meals prepared according to Islamic law")
         
-        st.subheader("⚙️ Basic Settings")
-        gender = st.selectbox("Gender", ["male", "female", "other"], 
-                             help="Affects nutritional targets")
-        budget = st.slider("Weekly Budget ($)", 50, 300, 100, 5,
-                          help="Maximum amount to spend on meals per week")
+        with col2:
+            st.subheader("🎯 Health Goals")
+            gain_weight = st.checkbox("Gain Weight", help="Higher calorie meals")
+            lose_weight = st.checkbox("Lose Weight", help="Lower calorie meals")
+            gain_muscle = st.checkbox("Gain Muscle", help="High protein meals")
         
-        st.caption(f"💰 Selected budget: **${budget}** for 14 meals")
-    
-    st.markdown("---")
-    col_back, col_optimize = st.columns([1, 2])
+            st.subheader("🍽️ Food Preferences")
+            avoid_grains = st.checkbox("Avoid Grains", help="No rice, wheat, oats, etc.")
+            avoid_legumes = st.checkbox("Avoid Legumes", help="No beans, lentils, peas")
+            avoid_bread = st.checkbox("Avoid Bread", help="No bread products")
+            avoid_dairy = st.checkbox("Avoid Dairy", help="No milk, cheese, yogurt")
+            avoid_spicy = st.checkbox("Avoid Spicy Food", help="No hot/spicy dishes")
+            avoid_fried = st.checkbox("Avoid Fried Food", help="No fried preparations")
+        
+            st.subheader("⚙️ Basic Settings")
+            gender = st.selectbox("Gender", ["male", "female", "other"], 
+                                 help="Affects nutritional targets")
+            budget = st.slider("Weekly Budget ($)", 50, 300, 100, 5,
+                              help="Maximum amount to spend on the 14 meals of the week")
+        
+        st.markdown("---")
+        submitted = st.form_submit_button("🚀 Generate Optimal Plan", key="optimize_btn", type="primary")
     
-    with col_back:
-        if st.button("⬅️ Back to Upload"):
-            st.session_state.step = 1
-            st.rerun()
+    if st.button("⬅️ Back to Upload"):
+        st.session_state.step = 1
+        st.rerun()
     
-    with col_optimize:
-        if st.button("🚀 Generate Optimal Plan", key="optimize_btn", type="primary"):
-            if st.session_state.csv_data is None:
-                st.error("❌ Please upload a CSV file first or use the default database.")
-            else:
-                with st.spinner("🔄 Optimizing your meal plan... This may take 10-30 seconds."):
-                    try:
-                        # Store preferences
-                        preferences = {
-                            'diabetic': diabetic, 'celiac': celiac, 'lactose_intolerant': lactose_intolerant,
-                            'nut_allergy': nut_allergy, 'vegan': vegan, 'vegetarian': vegetarian,
-                            'pescatarian': pescatarian, 'keto': keto, 'kosher': kosher, 'halal': halal,
-                            'gain_weight': gain_weight, 'lose_weight': lose_weight, 'gain_muscle': gain_muscle,
-                            'avoid_grains': avoid_grains, 'avoid_legumes': avoid_legumes, 'avoid_bread': avoid_bread,
-                            'avoid_dairy': avoid_dairy, 'avoid_spicy': avoid_spicy, 'avoid_fried': avoid_fried,
-                            'gender': gender, 'budget': budget
-                        }
-                        
-                        # Run optimization
-                        results = run_optimization(st.session_state.csv_data, preferences)
-                        st.session_state.results = results
-                        st.session_state.step = 3
-                        st.rerun()
-                        
-                    except Exception as e:
-                        st.error(f"❌ Optimization failed: {str(e)}")
-                        st.info("💡 **Suggestions:**")
-                        st.write("• Try increasing your budget")
-                        st.write("• Relax some dietary restrictions")
-                        st.write("• Ensure your CSV has enough meal variety")
+    if submitted:
+        if st.session_state.csv_data is None:
+            st.error("❌ Please upload a CSV file first or use the default database.")
+        else:
+            with st.spinner("🔄 Optimizing your meal plan... This may take 10-30 seconds."):
+                try:
+                    # Store preferences
+                    preferences = {
+                        'diabetic': diabetic, 'celiac': celiac, 'lactose_intolerant': lactose_intolerant,
+                        'nut_allergy': nut_allergy, 'vegan': vegan, 'vegetarian': vegetarian,
+                        'pescatarian': pescatarian, 'keto': keto, 'kosher': kosher, 'halal': halal,
+                        'gain_weight': gain_weight, 'lose_weight': lose_weight, 'gain_muscle': gain_muscle,
+                        'avoid_grains': avoid_grains, 'avoid_legumes': avoid_legumes, 'avoid_bread': avoid_bread,
+                        'avoid_dairy': avoid_dairy, 'avoid_spicy': avoid_spicy, 'avoid_fried': avoid_fried,
+                        'gender': gender, 'budget': budget
+                    }
+                    
+                    # Run optimization
+                    # The previous plan (if any) seeds the solver when preferences are tweaked
+                    results = run_optimization(st.session_state.csv_data, preferences,
+                                               st.session_state.flag_arrays,
+                                               st.session_state.results)
+                    st.session_state.results = results
+                    st.session_state.step = 3
+                    st.rerun()
+                    
+                except Exception as e:
+                    st.error(f"❌ Optimization failed: {str(e)}")
+                    st.info("💡 **Suggestions:**")
+                    st.write("• Try increasing your budget")
+                    st.write("• Relax some dietary restrictions")
+                    st.write("• Ensure your CSV has enough meal variety")
 
 # ==================== STEP 3: RESULTS ====================
 elif st.session_state.step == 3 and st.session_state.results is not None:
@@ -284,6 +790,9 @@ elif st.session_state.step == 3 and st.session_state.results is not None:
     st.subheader("📅 Your Weekly Schedule")
     
     plan_df = pd.DataFrame(results['plan'])
+    # Cache key for the charts and the CSV export
+    plan_json = plan_df.to_json(orient='records')
+    by_slot = {(p['day'], p['meal_type']): p for p in results['plan']}
     
     # Show by day
     days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
@@ -291,39 +800,18 @@ elif st.session_state.step == 3 and st.session_state.results is not None:
     for day in days:
         with st.container():
             st.markdown(f"### 📆 {day}")
-            day_meals = plan_df[plan_df['day'] == day]
             
             col_lunch, col_dinner = st.columns(2)
             
-            with col_lunch:
-                lunch = day_meals[day_meals['meal_type'] == 'Lunch']
-                if len(lunch) > 0:
-                    lunch = lunch.iloc[0]
-                    st.markdown(f"""
-                    <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); 
-                                padding: 1.5rem; border-radius: 10px; color: white;">
-                        <h4>🌅 LUNCH</h4>
-                        <h3>{lunch['dish']}</h3>
-                        <p>📍 {lunch['restaurant']}</p>
-                        <hr style="border-color: white; opacity: 0.3;">
-                        <p>💵 ${lunch['price']:.2f} | 🔥 {lunch['calories']:.0f} kcal | 💪 {lunch['protein']:.1f}g</p>
-                    </div>
-                    """, unsafe_allow_html=True)
-            
-            with col_dinner:
-                dinner = day_meals[day_meals['meal_type'] == 'Dinner']
-                if len(dinner) > 0:
-                    dinner = dinner.iloc[0]
-                    st.markdown(f"""
-                    <div style="background: linear-gradient(135deg, #f093fb 0%, #f5576c 100%); 
-                                padding: 1.5rem; border-radius: 10px; color: white;">
-                        <h4>🌙 DINNER</h4>
-                        <h3>{dinner['dish']}</h3>
-                        <p>📍 {dinner['restaurant']}</p>
-                        <hr style="border-color: white; opacity: 0.3;">
-                        <p>💵 ${dinner['price']:.2f} | 🔥 {dinner['calories']:.0f} kcal | 💪 {dinner['protein']:.1f}g</p>
-                    </div>
-                    """, unsafe_allow_html=True)
+            for col, meal_type in zip((col_lunch, col_dinner), MEAL_TYPES):
+                with col:
+                    meal = by_slot.get((day, meal_type))
+                    if meal is not None:
+                        st.markdown(MEAL_CARD.format_map({
+                            **meal,
+                            'card_class': meal_type.lower(),
+                            'card_title': MEAL_CARD_TITLES[meal_type]
+                        }), unsafe_allow_html=True)
             
             st.markdown("<br>", unsafe_allow_html=True)
     
@@ -332,44 +820,18 @@ elif st.session_state.step == 3 and st.session_state.results is not None:
     # Charts
     st.subheader("📈 Nutritional Analysis")
     
+    fig_cal, fig_prot, fig_rest = build_charts(plan_json, tuple(days))
+    
     chart_col1, chart_col2 = st.columns(2)
     
     with chart_col1:
-        # Daily calories chart
-        daily_stats = plan_df.groupby('day').agg({'calories': 'sum'}).reset_index()
-        daily_stats['day'] = pd.Categorical(daily_stats['day'], categories=days, ordered=True)
-        daily_stats = daily_stats.sort_values('day')
-        
-        fig_cal = px.bar(daily_stats, x='day', y='calories', 
-                        title='Daily Calories Distribution',
-                        labels={'calories': 'Calories (kcal)', 'day': 'Day'},
-                        color='calories',
-                        color_continuous_scale='Blues')
-        fig_cal.update_layout(showlegend=False)
         st.plotly_chart(fig_cal, use_container_width=True)
     
     with chart_col2:
-        # Daily protein chart
-        daily_protein = plan_df.groupby('day').agg({'protein': 'sum'}).reset_index()
-        daily_protein['day'] = pd.Categorical(daily_protein['day'], categories=days, ordered=True)
-        daily_protein = daily_protein.sort_values('day')
-        
-        fig_prot = px.bar(daily_protein, x='day', y='protein',
-                         title='Daily Protein Distribution',
-                         labels={'protein': 'Protein (g)', 'day': 'Day'},
-                         color='protein',
-                         color_continuous_scale='Greens')
-        fig_prot.update_layout(showlegend=False)
         st.plotly_chart(fig_prot, use_container_width=True)
     
     # Restaurant distribution
     st.subheader("🏪 Restaurant Variety")
-    restaurant_counts = plan_df['restaurant'].value_counts().reset_index()
-    restaurant_counts.columns = ['Restaurant', 'Meals']
-    
-    fig_rest = px.pie(restaurant_counts, values='Meals', names='Restaurant',
-                      title='Meals per Restaurant',
-                      color_discrete_sequence=px.colors.qualitative.Set3)
     st.plotly_chart(fig_rest, use_container_width=True)
     
     # Export button
@@ -379,7 +841,7 @@ elif st.session_state.step == 3 and st.session_state.results is not None:
     col_export1, col_export2 = st.columns(2)
     
     with col_export1:
-        csv_export = plan_df.to_csv(index=False)
+        csv_export = build_plan_csv(plan_json)
         st.download_button(
             label="📄 Download as CSV",
             data=csv_export,
@@ -420,177 +882,7 @@ Generated by Smart Dining on Campus
         if st.button("🔄 Start Over", use_container_width=True):
             st.session_state.step = 1
             st.session_state.csv_data = None
+            st.session_state.flag_arrays = None
             st.session_state.results = None
             st.session_state.using_default = False
             st.rerun()
-
-
-# ==================== OPTIMIZATION FUNCTION ====================
-def run_optimization(df, preferences):
-    """Run the meal plan optimization using PuLP linear programming"""
-    
-    filtered = df.copy()
-    
-    # Apply filters based on preferences
-    if preferences['diabetic']:
-        filtered = filtered[filtered['diabetic_friendly'] == 1]
-    if preferences['celiac']:
-        filtered = filtered[filtered['contains_gluten'] == 0]
-    if preferences['lactose_intolerant']:
-        filtered = filtered[filtered['contains_lactose'] == 0]
-    if preferences['nut_allergy']:
-        filtered = filtered[filtered['contains_nuts'] == 0]
-    if preferences['vegan']:
-        filtered = filtered[filtered['vegan '] == 1]  # Note: space in column name
-    if preferences['vegetarian']:
-        filtered = filtered[filtered['vegetarian'] == 1]
-    if preferences['pescatarian']:
-        filtered = filtered[filtered['pescatarian'] == 1]
-    if preferences['keto']:
-        filtered = filtered[filtered['keto_friendly'] == 1]
-    if preferences['kosher']:
-        filtered = filtered[filtered['kosher'] == 1]
-    if preferences['halal']:
-        filtered = filtered[filtered['halal'] == 1]
-    if preferences['gain_weight']:
-        filtered = filtered[filtered['gaining_weight_diet'] == 1]
-    if preferences['lose_weight']:
-        filtered = filtered[filtered['loose_weight_diet'] == 1]
-    if preferences['gain_muscle']:
-        filtered = filtered[filtered['gaining_muscle_diet'] == 1]
-    if preferences['avoid_grains']:
-        filtered = filtered[filtered['contains_grains'] == 0]
-    if preferences['avoid_legumes']:
-        filtered = filtered[filtered['contains_legumes'] == 0]
-    if preferences['avoid_bread']:
-        filtered = filtered[filtered['contains_bread'] == 0]
-    if preferences['avoid_dairy']:
-        filtered = filtered[filtered['contains_dairy'] == 0]
-    if preferences['avoid_spicy']:
-        filtered = filtered[filtered['spicy'] == 0]
-    if preferences['avoid_fried']:
-        filtered = filtered[filtered['fried'] == 0]
-    
-    if len(filtered) < 14:
-        raise Exception(f"Not enough meals after filtering. Only {len(filtered)} meals available. Need at least 14 meals to create a weekly plan.")
-    
-    # Reset index
-    filtered = filtered.reset_index(drop=True)
-    meal_indices = list(filtered.index)
-    
-    days = range(7)
-    day_names = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
-    meals = ["Lunch", "Dinner"]
-    restaurants = filtered["Restaurant"].unique().tolist()
-    
-    # Nutritional targets based on gender
-    if preferences['gender'] == "male":
-        cal_min, cal_max = 1100, 1600
-        protein_min = 50
-    elif preferences['gender'] == "female":
-        cal_min, cal_max = 900, 1400
-        protein_min = 45
-    else:
-        cal_min, cal_max = 1000, 1500
-        protein_min = 45
-    
-    # Create optimization problem
-    prob = pl.LpProblem("WeeklyMealPlan", pl.LpMinimize)
-    
-    # Decision variables: x[i,d,m] = 1 if meal i is chosen on day d for meal type m
-    x = {}
-    for i in meal_indices:
-        for d in days:
-            for m in meals:
-                x[(i, d, m)] = pl.LpVariable(f"x_{i}_{d}_{m}", cat="Binary")
-    
-    # Objective function: minimize total cost
-    total_cost = pl.lpSum(
-        filtered.loc[i, "price"] * x[(i, d, m)]
-        for i in meal_indices for d in days for m in meals
-    )
-    prob += total_cost
-    
-    # ==================== CONSTRAINTS ====================
-    
-    # C1: Budget constraint
-    prob += total_cost <= preferences['budget'], "BudgetConstraint"
-    
-    # C2: Exactly 1 meal per (day, meal type)
-    for d in days:
-        for m in meals:
-            prob += pl.lpSum(x[(i, d, m)] for i in meal_indices) == 1, f"OneMeal_day{d}_{m}"
-    
-    # C3: Each dish max once per week (no repeats)
-    for i in meal_indices:
-        prob += pl.lpSum(x[(i, d, m)] for d in days for m in meals) <= 1, f"UniqueMeal_{i}"
-    
-    # C4: Max 5 meals from same restaurant per week
-    for r in restaurants:
-        prob += pl.lpSum(
-            x[(i, d, m)]
-            for i in meal_indices for d in days for m in meals
-            if filtered.loc[i, "Restaurant"] == r
-        ) <= 5, f"MaxRestaurantWeek_{r}"
-    
-    # C5: Max 1 meal per restaurant per day
-    for d in days:
-        for r in restaurants:
-            prob += pl.lpSum(
-                x[(i, d, m)]
-                for i in meal_indices for m in meals
-                if filtered.loc[i, "Restaurant"] == r
-            ) <= 1, f"MaxRestaurantDay_{d}_{r}"
-    
-    # C6: No legumes at dinner
-    for d in days:
-        prob += pl.lpSum(
-            x[(i, d, "Dinner")]
-            for i in meal_indices
-            if filtered.loc[i, "contains_legumes"] == 1
-        ) == 0, f"NoLegumesDinner_{d}"
-    
-    # C7: No grains at dinner
-    for d in days:
-        prob += pl.lpSum(
-            x[(i, d, "Dinner")]
-            for i in meal_indices
-            if filtered.loc[i, "contains_grains"] == 1
-        ) == 0, f"NoGrainsDinner_{d}"
-    
-    # Solve the optimization problem
-    status = prob.solve(pl.PULP_CBC_CMD(msg=0))
-    
-    if pl.LpStatus[status] != "Optimal":
-        raise Exception("Could not find optimal solution. Try increasing budget or relaxing some constraints.")
-    
-    # Extract solution
-    plan = []
-    for d in days:
-        for m in meals:
-            for i in meal_indices:
-                if pl.value(x[(i, d, m)]) > 0.5:
-                    row = filtered.loc[i]
-                    plan.append({
-                        'day': day_names[d],
-                        'meal_type': m,
-                        'restaurant': row['Restaurant'],
-                        'dish': row['Meal'],
-                        'price': row['price'],
-                        'calories': row['calories_kcal'],
-                        'protein': row['protein_g']
-                    })
-    
-    # Calculate metrics
-    plan_df = pd.DataFrame(plan)
-    actual_cost = plan_df['price'].sum()
-    avg_calories = plan_df.groupby('day')['calories'].sum().mean()
-    avg_protein = plan_df.groupby('day')['protein'].sum().mean()
-    
-    return {
-        'plan': plan,
-        'total_cost': actual_cost,
-        'budget_used': (actual_cost / preferences['budget']) * 100,
-        'avg_calories': avg_calories,
-        'avg_protein': avg_protein
-    }